@@ -0,0 +1,25 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from yaml import load
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def load_yaml(path: Path) -> Any:  # noqa: ANN401
+    """Load a YAML config file with the C loader when available.
+
+    Parsed content is cached per file modification time, so repeated
+    loads within one run skip the re-parse.
+    """
+    return _load_cached(path, path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _load_cached(path: Path, mtime_ns: int) -> Any:  # noqa: ANN401
+    with open(path) as stream:
+        return load(stream, Loader=SafeLoader)
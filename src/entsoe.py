@@ -1,9 +1,50 @@
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
+from io import BytesIO
 from os import getenv
-from xml.etree import ElementTree
+from typing import IO
 
-from requests import get
+from lxml import etree
+from requests import Session
+from requests.adapters import HTTPAdapter, Retry
+
+# Resolutions used by ENTSO-E; the compiled regex is only a fallback for
+# values outside this set. Note \d+ so that a bare "PTM" fails loudly.
+_RESOLUTION_MINUTES = {"PT60M": 60, "PT30M": 30, "PT15M": 15}
+_RESOLUTION_RE = re.compile(r"PT(\d+)M")
+
+
+def _parse_timestamp(value: str) -> datetime:
+    # ENTSO-E emits fixed-width "YYYY-MM-DDTHH:MMZ" timestamps; slicing the
+    # fields out is considerably faster than fromisoformat, which stays as a
+    # fallback should the format ever drift.
+    if len(value) == 17 and value[16] == "Z":
+        return datetime(
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            tzinfo=timezone.utc,
+        )
+    return datetime.fromisoformat(value)
+
+
+def _create_session() -> Session:
+    session = Session()
+    session.headers["User-Agent"] = "spot-pricing/1.0"
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504)
+        ),
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+_session = _create_session()
 
 
 class DayAheadPrices:
@@ -13,6 +54,9 @@ class DayAheadPrices:
     https://transparency.entsoe.eu/content/static_content/Static%20content/web%20api/Guide.html
     """
 
+    API_URL = "https://web-api.tp.entsoe.eu/api"
+    DOMAIN = "10YFI-1--------U"
+
     def __init__(self) -> None:
         self.api_token = getenv("ENTSOE_API_TOKEN")
         if not self.api_token:
@@ -21,22 +65,23 @@ class DayAheadPrices:
                 "Set environment variable ENTSOE_API_TOKEN."
             )
 
-    def fetch(self, start: datetime, end: datetime) -> str:
+    def fetch(self, start: datetime, end: datetime) -> bytes:
         time_start = start.strftime("%Y-%m-%dT%H:%MZ")
         time_end = end.strftime("%Y-%m-%dT%H:%MZ")
         time_interval = f"{time_start}/{time_end}"
-        r = get(
-            "https://web-api.tp.entsoe.eu/api",
+        r = _session.get(
+            self.API_URL,
             params={
                 "securityToken": self.api_token,
                 "documentType": "A44",
                 "TimeInterval": time_interval,
-                "in_domain": "10YFI-1--------U",
-                "out_domain": "10YFI-1--------U",
+                "in_domain": self.DOMAIN,
+                "out_domain": self.DOMAIN,
             },
+            timeout=(5, 30),
         )
         r.raise_for_status()
-        return r.text
+        return r.content
 
 
 class DayAheadPricesParser:
@@ -45,20 +90,36 @@ class DayAheadPricesParser:
     Retrieve hourly pricing information.
     """
 
-    def parse(self, data: str) -> dict[datetime, float]:
-        result = {}
-        root = ElementTree.fromstring(data)
-        ns = {"doc": re.match(r"\{(.*)\}", root.tag).group(1)}  # type: ignore
-        for time_series in root.findall(".//doc:TimeSeries", ns):
-            time_interval = time_series.find(".//doc:timeInterval", ns)
-            start = time_interval.find("doc:start", ns)  # type: ignore
-            start_time = datetime.fromisoformat(start.text)  # type: ignore
-            resolution = time_series.find(".//doc:resolution", ns)
-            resolution_minutes = int(re.match(r"PT(\d*)M", resolution.text).group(1))  # type: ignore
-            for point in time_series.findall(".//doc:Point", ns):
-                position = int(point.find("doc:position", ns).text)  # type: ignore
-                price = float(point.find("doc:price.amount", ns).text)  # type: ignore
-                delta = timedelta(minutes=resolution_minutes * (position - 1))
-                time = start_time + delta
+    def parse(self, data: bytes | IO[bytes]) -> dict[datetime, float]:
+        result: dict[datetime, float] = {}
+        start_seconds = 0.0
+        resolution_seconds = 0
+        source = BytesIO(data) if isinstance(data, bytes) else data
+        for _, element in etree.iterparse(source, events=("end",)):
+            tag = etree.QName(element).localname
+            if tag == "start":
+                start_seconds = _parse_timestamp(element.text).timestamp()
+            elif tag == "resolution":
+                resolution_minutes = _RESOLUTION_MINUTES.get(element.text) or int(
+                    _RESOLUTION_RE.match(element.text).group(1)  # type: ignore
+                )
+                resolution_seconds = resolution_minutes * 60
+            elif tag == "Point":
+                position = 0
+                price = 0.0
+                for child in element:
+                    name = etree.QName(child).localname
+                    if name == "position":
+                        position = int(child.text)
+                    elif name == "price.amount":
+                        price = float(child.text)
+                time = datetime.fromtimestamp(
+                    start_seconds + resolution_seconds * (position - 1), timezone.utc
+                )
                 result[time] = price
-        return dict(sorted(result.items()))  # type: ignore
+                element.clear()
+            elif tag == "TimeSeries":
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+        return dict(sorted(result.items()))
@@ -1,14 +1,22 @@
+from bisect import bisect_left, bisect_right
 from datetime import datetime
+from functools import lru_cache
 from os import PathLike
 from typing import AnyStr
 
-from dateutil import relativedelta
 from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import NamedStyle
 from openpyxl.worksheet.worksheet import Worksheet
-from pytz import timezone
+from pytz import BaseTzInfo, timezone
 from zaptec import UserChargeHistory
 
 
+@lru_cache(maxsize=32)
+def _tz(zone: str) -> BaseTzInfo:
+    return timezone(zone)
+
+
 class ZaptecInvoice:
     """Create invoice of Zaptec charging based on spot prices"""
 
@@ -23,21 +31,26 @@ class ZaptecInvoice:
         user_charge_histories: dict[str, UserChargeHistory],
     ) -> None:
         (start, end) = self._get_start_end_times(year, month, zone)
-        wb = Workbook()
+        # DayAheadPricesParser returns the prices sorted by time, so the keys
+        # can be sliced with bisect instead of testing every row.
+        prices = (list(day_ahead_prices), list(day_ahead_prices.values()))
+        wb = Workbook(write_only=True)
         wb.iso_dates = True
+        wb.add_named_style(NamedStyle(name="money", number_format="0.00"))
         self._fill_invoising(wb, contract, user_charge_histories)
         self._fill_contract_info(wb, contract)
-        self._fill_spot_price(wb, start, end, zone, contract, day_ahead_prices)
-        self._fill_charge_histories(wb, start, end, zone, user_charge_histories)
-        wb.remove_sheet(wb.get_sheet_by_name("Sheet"))
+        self._fill_spot_price(wb, start, end, zone, contract, prices)
+        self._fill_charge_histories(
+            wb, start, end, zone, contract, prices, user_charge_histories
+        )
         wb.save(filename)  # type:ignore
 
     def _get_start_end_times(
         self, year: int, month: int, zone: str
     ) -> tuple[datetime, datetime]:
         start = datetime(year=year, month=month, day=1)
-        end = start + relativedelta.relativedelta(months=1)
-        tz = timezone(zone)
+        end = datetime(year=year + month // 12, month=month % 12 + 1, day=1)
+        tz = _tz(zone)
         return (tz.localize(start), tz.localize(end))
 
     def _fill_invoising(
@@ -47,15 +60,10 @@ class ZaptecInvoice:
         user_charge_histories: dict[str, UserChargeHistory],
     ) -> None:
         invoising = wb.create_sheet("Laskutus")
-        invoising.column_dimensions["A"].width = 20
-        invoising.column_dimensions["B"].width = 20
+        invoising.sheet_format.defaultColWidth = 20
         invoising.column_dimensions["C"].width = 16
         invoising.column_dimensions["D"].width = 16
         invoising.column_dimensions["E"].width = 16
-        invoising.column_dimensions["F"].width = 20
-        invoising.column_dimensions["G"].width = 20
-        invoising.column_dimensions["H"].width = 20
-        invoising.column_dimensions["I"].width = 20
         invoising.append(
             [
                 "Tili",
@@ -70,42 +78,52 @@ class ZaptecInvoice:
             ]
         )
         vat_factor = 1 + contract["value_added_tax_percentage"] / 100
-        last_row = 0
-        for i, (user, charge_history) in enumerate(user_charge_histories.items()):
+        row = 1
+        for row, (user, charge_history) in enumerate(
+            user_charge_histories.items(), start=2
+        ):
             invoising.append(
                 [
                     user,
                     charge_history.full_name,
                     f"=SUM('{user}'!B:B)",
-                    f"=E{i+2}*{vat_factor}",
-                    f"=SUM('{user}'!F:F)",
-                    f"=D{i+2}/C{i+2}*100",
-                    f"=E{i+2}/C{i+2}*100",
-                    f"=F{i+2}-'Sähkösopimus'!B5",
-                    f"=G{i+2}-'Sähkösopimus'!C5",
+                    *self._number_cells(
+                        invoising,
+                        f"=E{row}*{vat_factor}",
+                        f"=SUM('{user}'!F:F)",
+                        f"=D{row}/C{row}*100",
+                        f"=E{row}/C{row}*100",
+                        f"=F{row}-'Sähkösopimus'!B5",
+                        f"=G{row}-'Sähkösopimus'!C5",
+                    ),
                 ]
             )
-            last_row = i
+        total_row = row + 1
         invoising.append(
             [
                 "Yhteensä",
                 "",
-                f"=SUM(C2:C{last_row+2})",
-                f"=SUM(D2:D{last_row+2})",
-                f"=SUM(E2:E{last_row+2})",
-                f"=D{last_row+3}/C{last_row+3}*100",
-                f"=E{last_row+3}/C{last_row+3}*100",
-                f"=F{last_row+3}-'Sähkösopimus'!B5",
-                f"=G{last_row+3}-'Sähkösopimus'!C5",
+                f"=SUM(C2:C{row})",
+                *self._number_cells(
+                    invoising,
+                    f"=SUM(D2:D{row})",
+                    f"=SUM(E2:E{row})",
+                    f"=D{total_row}/C{total_row}*100",
+                    f"=E{total_row}/C{total_row}*100",
+                    f"=F{total_row}-'Sähkösopimus'!B5",
+                    f"=G{total_row}-'Sähkösopimus'!C5",
+                ),
             ]
         )
-        for i in range(2, last_row + 4):
-            invoising[f"D{i}"].number_format = "0.00"
-            invoising[f"E{i}"].number_format = "0.00"
-            invoising[f"F{i}"].number_format = "0.00"
-            invoising[f"G{i}"].number_format = "0.00"
-            invoising[f"H{i}"].number_format = "0.00"
-            invoising[f"I{i}"].number_format = "0.00"
+
+    @staticmethod
+    def _number_cells(sheet: Worksheet, *values: str) -> list[Cell]:
+        cells: list[Cell] = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.style = "money"
+            cells.append(cell)
+        return cells
 
     def _fill_contract_info(
         self,
@@ -114,9 +132,7 @@ class ZaptecInvoice:
     ) -> None:
         vat_factor = 1 + contract["value_added_tax_percentage"] / 100
         contract_info: Worksheet = wb.create_sheet("Sähkösopimus")
-        contract_info.column_dimensions["A"].width = 20
-        contract_info.column_dimensions["B"].width = 20
-        contract_info.column_dimensions["C"].width = 20
+        contract_info.sheet_format.defaultColWidth = 20
         contract_info.append(
             ["", f"c/kWh ALV {contract['value_added_tax_percentage']}%", "c/kWh ALV 0%"]
         )
@@ -141,12 +157,24 @@ class ZaptecInvoice:
         start: datetime,
         end: datetime,
         zone: str,
+        contract: dict[str, float],
+        day_ahead_prices: tuple[list[datetime], list[float]],
         user_charge_histories: dict[str, UserChargeHistory],
     ) -> None:
         for user, charge_history in user_charge_histories.items():
             user_consumption_sheet: Worksheet = wb.create_sheet(user)
+            consumption = (
+                list(charge_history.consumption),
+                list(charge_history.consumption.values()),
+            )
             self._fill_user_consumption_sheet(
-                user_consumption_sheet, start, end, zone, charge_history
+                user_consumption_sheet,
+                start,
+                end,
+                zone,
+                contract,
+                day_ahead_prices,
+                consumption,
             )
 
     def _fill_user_consumption_sheet(
@@ -155,14 +183,11 @@ class ZaptecInvoice:
         start: datetime,
         end: datetime,
         zone: str,
-        charge_history: UserChargeHistory,
+        contract: dict[str, float],
+        day_ahead_prices: tuple[list[datetime], list[float]],
+        consumption: tuple[list[datetime], list[float]],
     ) -> None:
-        user_consumption_sheet.column_dimensions["A"].width = 20
-        user_consumption_sheet.column_dimensions["B"].width = 20
-        user_consumption_sheet.column_dimensions["C"].width = 20
-        user_consumption_sheet.column_dimensions["D"].width = 20
-        user_consumption_sheet.column_dimensions["E"].width = 20
-        user_consumption_sheet.column_dimensions["F"].width = 20
+        user_consumption_sheet.sheet_format.defaultColWidth = 20
         user_consumption_sheet.append(
             [
                 "Aika (UTC)",
@@ -173,22 +198,42 @@ class ZaptecInvoice:
                 "Hinta € ALV 0%",
             ]
         )
-        sorted_consumption = dict(sorted(charge_history.consumption.items()))
-        row = 2
-        for key, value in sorted_consumption.items():
-            if (key >= start) and (key < end):
-                time = key.astimezone(timezone(zone)).replace(tzinfo=None)
-                user_consumption_sheet.append(
-                    [
-                        time,
-                        value,
-                        f"=VLOOKUP(A{row},'Spot-hinta'!A:C,3,TRUE)",
-                        f"=B{row}*C{row}/100",
-                        f"='Sähkösopimus'!$C$5*B{row}/100",
-                        f"=D{row}+E{row}",
-                    ]
+        vat_factor = 1 + contract["value_added_tax_percentage"] / 100
+        # Same value as cell C5 of the contract sheet; inlined so the user
+        # sheets do not force Excel to chase cross-sheet references per row.
+        # Rounded so the formula text shows a short constant instead of the
+        # full float repr.
+        fixed_price = round(
+            (
+                contract["transfer_price_with_vat_c_kwh"]
+                + contract["electricity_tax_with_vat_c_kwh"]
+                + contract["margin_with_vat_c_kwh"]
+            )
+            / vat_factor,
+            6,
+        )
+        tz = _tz(zone)
+        price_keys, price_values = day_ahead_prices
+        keys, values = consumption
+        low = bisect_left(keys, start)
+        high = bisect_left(keys, end)
+        rows: list[tuple[datetime, float, float | None, str, str, str]] = []
+        for row, i in enumerate(range(low, high), start=2):
+            key = keys[i]
+            price_index = bisect_right(price_keys, key) - 1
+            spot_price = price_values[price_index] / 10 if price_index >= 0 else None
+            rows.append(
+                (
+                    key.astimezone(tz).replace(tzinfo=None),
+                    values[i],
+                    spot_price,
+                    f"=B{row}*C{row}/100",
+                    f"={fixed_price}*B{row}/100",
+                    f"=D{row}+E{row}",
                 )
-                row += 1
+            )
+        for values_row in rows:
+            user_consumption_sheet.append(values_row)
 
     def _fill_spot_price(
         self,
@@ -197,14 +242,12 @@ class ZaptecInvoice:
         end: datetime,
         zone: str,
         contract: dict[str, float],
-        day_ahead_prices: dict[datetime, float],
+        day_ahead_prices: tuple[list[datetime], list[float]],
     ) -> None:
         vat_factor = 1 + contract["value_added_tax_percentage"] / 100
         spot_price_sheet: Worksheet = wb.create_sheet("Spot-hinta")
+        spot_price_sheet.sheet_format.defaultColWidth = 16
         spot_price_sheet.column_dimensions["A"].width = 20
-        spot_price_sheet.column_dimensions["B"].width = 16
-        spot_price_sheet.column_dimensions["C"].width = 16
-        spot_price_sheet.column_dimensions["D"].width = 16
         spot_price_sheet.append(
             [
                 f"Aika ({zone})",
@@ -213,11 +256,18 @@ class ZaptecInvoice:
                 f"c/kWh (ALV {contract['value_added_tax_percentage']}%)",
             ]
         )
-        row = 2
-        for key, value in day_ahead_prices.items():
-            if (key >= start) and (key < end):
-                time = key.astimezone(timezone(zone)).replace(tzinfo=None)
-                spot_price_sheet.append(
-                    [time, value, f"=B{row}/1000*100", f"=C{row}*{vat_factor}"]
-                )
-                row += 1
+        tz = _tz(zone)
+        keys, values = day_ahead_prices
+        low = bisect_left(keys, start)
+        high = bisect_left(keys, end)
+        rows: list[tuple[datetime, float, str, str]] = [
+            (
+                keys[i].astimezone(tz).replace(tzinfo=None),
+                values[i],
+                f"=B{row}/1000*100",
+                f"=C{row}*{vat_factor}",
+            )
+            for row, i in enumerate(range(low, high), start=2)
+        ]
+        for values_row in rows:
+            spot_price_sheet.append(values_row)
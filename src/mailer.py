@@ -1,16 +1,17 @@
 import smtplib
-from datetime import datetime
+from argparse import Namespace
+from datetime import datetime, timedelta
 from email.headerregistry import Address
 from email.message import EmailMessage
 from mimetypes import guess_type
 from os import getenv
 from pathlib import Path
 from ssl import create_default_context
-from subprocess import run
+from types import TracebackType
 from typing import Any
 
-from dateutil import relativedelta
-from yaml import safe_load
+from config import load_yaml
+from spot_pricing import ZaptecSpotPricing
 
 
 class EmailGenerator:
@@ -45,8 +46,7 @@ class EmailGenerator:
     def _read_config(config_file: Path) -> dict[str, Any]:
         if not config_file.exists():
             raise RuntimeError(f"Email config file not found: {config_file}")
-        with open(config_file) as stream:
-            return safe_load(stream)["email"]
+        return load_yaml(config_file)["email"]
 
     @staticmethod
     def _add_attachement(message: EmailMessage, filename: Path) -> None:
@@ -72,45 +72,73 @@ class MailSender:
                 f"Environment variable {self._config['password_env_variable']} not set!"
             )
         self._password = password
+        self._server: smtplib.SMTP | None = None
+
+    def __enter__(self) -> "MailSender":
+        self._server = self._connect()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        server = self._server
+        self._server = None
+        if server is not None:
+            server.quit()
 
     def send(self, message: EmailMessage) -> None:
+        print("Message\n\n")
+        print(message)
+        print("\nSending...\n")
+        if self._server is not None:
+            self._server.send_message(message)
+            return
+        server = self._connect()
+        try:
+            server.send_message(message)
+        finally:
+            server.quit()
+
+    def _connect(self) -> smtplib.SMTP:
         context = create_default_context()
-        server = smtplib.SMTP(host=self._config["host"], port=self._config["port"])
+        server = smtplib.SMTP(
+            host=self._config["host"], port=self._config["port"], timeout=30
+        )
         try:
             response = server.starttls(context=context)
             if response[0] != 220:
                 raise Exception("Connection not secure!")
             server.login(user=self._config["user"], password=self._password)
-            print("Message\n\n")
-            print(message)
-            print("\nSending...\n")
-            server.send_message(message)
-        finally:
+        except Exception:
             server.quit()
+            raise
+        return server
 
     @staticmethod
     def _read_config(config_file: Path) -> dict[str, Any]:
         if not config_file.exists():
             raise RuntimeError(f"Email config file not found: {config_file}")
-        with open(config_file) as stream:
-            return safe_load(stream)["smtp_starttls"]
+        return load_yaml(config_file)["smtp_starttls"]
 
 
 def generate_invoice(year: int, month: int) -> Path:
     path = Path(f"results/invoice-{year}-{month}.xlsx")
     if path.exists():
         path.unlink()
-    run(
-        [
-            "python",
-            "spot-pricing.py",
-            "--year",
-            str(year),
-            "--month",
-            str(month),
-            "--ignore-cache",
-        ]
+    # Defaults mirror the command line arguments of spot_pricing._main.
+    args = Namespace(
+        year=year,
+        month=month,
+        contract="contract.yaml",
+        zaptec_installation_id=None,
+        timezone="Europe/Helsinki",
+        ignore_cache=True,
+        debug=False,
     )
+    ZaptecSpotPricing(args).create_invoice()
     if not path.exists():
         raise RuntimeError("Invoice generation failed!")
     return path
@@ -118,7 +146,7 @@ def generate_invoice(year: int, month: int) -> Path:
 
 if __name__ == "__main__":
     email_config_file = Path("email_config.yaml")
-    last_month = datetime.now() - relativedelta.relativedelta(months=1)
+    last_month = datetime.now().replace(day=1) - timedelta(days=1)
     invoice_filename = generate_invoice(last_month.year, last_month.month)
     message = EmailGenerator(email_config_file).generate_message(
         last_month.year, last_month.month, invoice_filename
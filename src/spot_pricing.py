@@ -0,0 +1,185 @@
+import http.client as http_client
+import logging
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from io import BytesIO
+from json import dumps
+from os import getcwd, getenv, replace
+from pathlib import Path
+from time import time
+
+from config import load_yaml
+from entsoe import DayAheadPrices, DayAheadPricesParser
+from excel import ZaptecInvoice
+from zaptec import ChargeHistory, ChargeHistoryParser, UserChargeHistory
+
+
+class _ParamCache:
+    """Cache fetched payloads keyed by the parameters of the fetch
+
+    Files are named by a hash of the fetch parameters, so changing the
+    fetch window or installation can never silently reuse stale data. A
+    sidecar .meta.json records the parameters and fetch time for
+    debugging. Entries older than CACHE_TTL seconds (default one week)
+    are refetched.
+    """
+
+    DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+    def __init__(self, folder: Path, suffix: str) -> None:
+        self._folder = folder
+        self._suffix = suffix
+        self._ttl = int(getenv("CACHE_TTL", str(self.DEFAULT_TTL_SECONDS)))
+
+    def get(self, key: dict[str, str]) -> bytes | None:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        if time() - path.stat().st_mtime > self._ttl:
+            return None
+        return path.read_bytes()
+
+    def put(self, key: dict[str, str], data: bytes) -> None:
+        self._folder.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        meta = path.with_suffix(".meta.json")
+        self._write_atomically(
+            meta, dumps({"params": key, "fetched_at": time()}).encode("utf-8")
+        )
+        self._write_atomically(path, data)
+
+    def _path(self, key: dict[str, str]) -> Path:
+        digest = sha256(dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+        return self._folder / f"{digest}{self._suffix}"
+
+    @staticmethod
+    def _write_atomically(path: Path, data: bytes) -> None:
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        replace(tmp, path)
+
+
+class ZaptecSpotPricing:
+    """Generate spot pricing invoices"""
+
+    # Fetch more than the selected month to cover timezone differences and long
+    # charging sessions.
+    EXTEND_FETCH_BY_DAYS = 10
+
+    def __init__(self, args: Namespace) -> None:
+        self.args = args
+
+    def create_invoice(self) -> None:
+        contract = self._fetch_contract()
+        # The two sources are independent and network-bound; fetch them
+        # concurrently so the wall-clock cost is the slower of the two.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            entsoe_future = executor.submit(self._fetch_entsoe_data)
+            zaptec_future = executor.submit(self._fetch_zaptec_data)
+            day_ahead_prices = entsoe_future.result()
+            user_charge_histories = zaptec_future.result()
+        results_folder = Path(getcwd()) / "results"
+        results_folder.mkdir(parents=True, exist_ok=True)
+        ZaptecInvoice().create(
+            results_folder / f"invoice-{self.args.year}-{self.args.month}.xlsx",
+            self.args.year,
+            self.args.month,
+            self.args.timezone,
+            contract,
+            day_ahead_prices,
+            user_charge_histories,
+        )
+
+    def _fetch_contract(self) -> dict[str, float]:
+        path = Path(self.args.contract)
+        if not path.exists():
+            raise RuntimeError(f"Contract file not found: {self.args.contract}")
+        return load_yaml(path)["contract"]
+
+    def _fetch_entsoe_data(self) -> dict[datetime, float]:
+        (start, end) = self._get_fetch_start_end_times()
+        cache = _ParamCache(self._get_cache_folder() / "entsoe", ".xml")
+        key = {"start": start.isoformat(), "end": end.isoformat()}
+        data = None if self.args.ignore_cache else cache.get(key)
+        if data is None:
+            data = DayAheadPrices().fetch(start, end)
+            cache.put(key, data)
+        return DayAheadPricesParser().parse(data)
+
+    def _fetch_zaptec_data(self) -> dict[str, UserChargeHistory]:
+        (start, end) = self._get_fetch_start_end_times()
+        cache = _ParamCache(self._get_cache_folder() / "zaptec", ".json")
+        key = {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "installation_id": self.args.zaptec_installation_id or "auto",
+        }
+        data = None if self.args.ignore_cache else cache.get(key)
+        if data is None:
+            with ChargeHistory() as charge_history:
+                if self.args.zaptec_installation_id:
+                    installation_id = self.args.zaptec_installation_id
+                else:
+                    available_ids = charge_history.available_installation_ids()
+                    if len(available_ids) == 0:
+                        raise RuntimeError(
+                            "No available installations with the given Zaptec "
+                            "credentials!"
+                        )
+                    if len(available_ids) > 1:
+                        raise RuntimeError(
+                            "Given Zaptec credentials have access to multiple "
+                            "installations. Use --zaptec-installation-id argument "
+                            "to indicate which one to use!"
+                        )
+                    installation_id = available_ids[0]
+                data = charge_history.fetch(installation_id, start, end)
+            cache.put(key, data)
+        return ChargeHistoryParser().parse(BytesIO(data))
+
+    def _get_cache_folder(self) -> Path:
+        return Path(getcwd()) / ".cache"
+
+    def _get_fetch_start_end_times(self) -> tuple[datetime, datetime]:
+        start = datetime(
+            year=self.args.year,
+            month=self.args.month,
+            day=1,
+            tzinfo=timezone.utc,
+        )
+        end = datetime(
+            year=start.year + start.month // 12,
+            month=start.month % 12 + 1,
+            day=1,
+            tzinfo=timezone.utc,
+        )
+        extend = timedelta(days=self.EXTEND_FETCH_BY_DAYS)
+        return (start - extend, end + extend)
+
+
+def _main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--month", type=int, required=True)
+    parser.add_argument("--contract", default="contract.yaml")
+    parser.add_argument("--zaptec-installation-id")
+    parser.add_argument("--timezone", default="Europe/Helsinki")
+    parser.add_argument("--ignore-cache", action="store_true")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    if args.debug:
+        http_client.HTTPConnection.debuglevel = 1
+        logging.basicConfig()
+        logging.getLogger().setLevel(logging.DEBUG)
+        requests_log = logging.getLogger("requests.packages.urllib3")
+        requests_log.setLevel(logging.DEBUG)
+        requests_log.propagate = True
+
+    ZaptecSpotPricing(args).create_invoice()
+
+
+if __name__ == "__main__":
+    _main()
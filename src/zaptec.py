@@ -1,10 +1,19 @@
+import asyncio
+from collections.abc import Iterator
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from json import dumps, loads
-from os import getenv
-from typing import Any
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from os import getcwd, getenv, replace
+from pathlib import Path
+from time import time as unix_time
+from types import TracebackType
+from typing import IO, Any
 
+import orjson
+from httpx import AsyncClient, Limits
+from ijson import items as ijson_items  # type:ignore
 from requests import Session, post
+from requests.adapters import HTTPAdapter
 
 
 class ChargeHistory:
@@ -23,28 +32,77 @@ class ChargeHistory:
                 "Set either environment variables ZAPTEC_USERNAME and ZAPTEC_PASSWORD "
                 "or ZAPTEC_APIKEY."
             )
+        self._headers: dict[str, str] | None = None
+        self._session: Session | None = None
 
-    def fetch(self, installation_id: str, start: datetime, end: datetime) -> str:
-        with self._create_session() as session:
-            first_page = self._fetch_page(session, 0, installation_id, start, end)
-            data = first_page["Data"]
+    def __enter__(self) -> "ChargeHistory":
+        self._session = self._create_session()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        session = self._session
+        self._session = None
+        if session is not None:
+            session.close()
+
+    # Upper bound for in-flight page requests, to stay within API rate limits.
+    MAX_CONCURRENT_REQUESTS = 8
+
+    # Sessions per page request; a typical month fits in one response. Should
+    # the server clamp this, pagination still collects the remaining pages.
+    PAGE_SIZE = 500
+
+    def fetch(self, installation_id: str, start: datetime, end: datetime) -> bytes:
+        return asyncio.run(self._fetch_async(installation_id, start, end))
+
+    async def _fetch_async(
+        self, installation_id: str, start: datetime, end: datetime
+    ) -> bytes:
+        async with self._create_client() as client:
+            first_page = await self._fetch_page(client, 0, installation_id, start, end)
             pages = first_page["Pages"]
-            for page in range(1, pages):
-                current_page = self._fetch_page(
-                    session, page, installation_id, start, end
-                )
-                data.extend(current_page["Data"])
-            return dumps({"Data": data}, ensure_ascii=False)
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+
+            async def fetch_page(page: int) -> Any:  # noqa: ANN401
+                async with semaphore:
+                    return await self._fetch_page(
+                        client, page, installation_id, start, end
+                    )
+
+            remaining_pages = await asyncio.gather(
+                *(fetch_page(page) for page in range(1, pages))
+            )
+            # Serialize item by item instead of aggregating everything into
+            # one list and dumping it as a single document, which would hold
+            # a second full copy of the payload in memory.
+            document = bytearray(b'{"Data":[')
+            first = True
+            for current_page in (first_page, *remaining_pages):
+                for item in current_page["Data"]:
+                    if not first:
+                        document += b","
+                    document += orjson.dumps(item)
+                    first = False
+            document += b"]}"
+            return bytes(document)
 
     def available_installation_ids(self) -> list[str]:
-        with self._create_session() as session:
-            installations_json = self._fetch_installations(session)
-            data = installations_json["Data"]
-            return [item["Id"] for item in data]
+        if self._session is not None:
+            installations_json = self._fetch_installations(self._session)
+        else:
+            with self._create_session() as session:
+                installations_json = self._fetch_installations(session)
+        data = installations_json["Data"]
+        return [item["Id"] for item in data]
 
-    def _fetch_page(
+    async def _fetch_page(
         self,
-        session: Session,
+        client: AsyncClient,
         page: int,
         installation_id: str,
         start: datetime,
@@ -55,11 +113,11 @@ class ChargeHistory:
             "From": start.isoformat(),
             "To": end.isoformat(),
             "DetailLevel": "1",
-            "PageSize": "10",
+            "PageSize": str(self.PAGE_SIZE),
             "PageIndex": str(page),
         }
         headers = {"Accept": "text/plain"}
-        r = session.get(
+        r = await client.get(
             "https://api.zaptec.com/api/chargehistory",
             params=params,
             headers=headers,
@@ -77,6 +135,9 @@ class ChargeHistory:
         return r.json()
 
     def _get_token(self) -> str:
+        token = self._read_cached_token()
+        if token:
+            return token
         token_response = post(
             "https://api.zaptec.com/oauth/token",
             data={
@@ -90,28 +151,105 @@ class ChargeHistory:
             allow_redirects=False,
         )
         token_response.raise_for_status()
-        return token_response.json()["access_token"]
+        token_json = token_response.json()
+        self._write_cached_token(
+            token_json["access_token"], token_json.get("expires_in", 0)
+        )
+        return token_json["access_token"]
+
+    @staticmethod
+    def _token_cache_file() -> Path:
+        return Path(getcwd()) / ".cache" / "zaptec" / "token.json"
+
+    @classmethod
+    def _read_cached_token(cls) -> str | None:
+        try:
+            cached = orjson.loads(cls._token_cache_file().read_bytes())
+        except (OSError, ValueError):
+            return None
+        if cached.get("expires_at", 0) <= unix_time():
+            return None
+        return cached.get("access_token")
+
+    @classmethod
+    def _write_cached_token(cls, token: str, expires_in: float) -> None:
+        # Refresh one minute before the server-side expiry to leave headroom
+        # for the requests made with the token.
+        cache_file = cls._token_cache_file()
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(".json.tmp")
+        tmp.unlink(missing_ok=True)
+        tmp.touch(mode=0o600)
+        tmp.write_bytes(
+            orjson.dumps(
+                {"access_token": token, "expires_at": unix_time() + expires_in - 60}
+            )
+        )
+        replace(tmp, cache_file)
+
+    def _auth_headers(self) -> dict[str, str]:
+        if self._headers is None:
+            if self.api_key:
+                self._headers = {"X-Api-Key": self.api_key}
+            else:
+                self._headers = {"Authorization": f"Bearer {self._get_token()}"}
+        return self._headers
 
     def _create_session(self) -> Session:
         session = Session()
-        if self.api_key:
-            session.headers.update({"X-Api-Key": self.api_key})
-        else:
-            token = self._get_token()
-            session.headers.update({"Authorization": f"Bearer {token}"})
+        session.headers.update(self._auth_headers())
+        session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
         return session
 
+    def _create_client(self) -> AsyncClient:
+        # HTTP/2 lets the concurrent page requests multiplex over a single
+        # TLS connection instead of opening one per in-flight request.
+        return AsyncClient(
+            http2=True,
+            headers=self._auth_headers(),
+            timeout=30,
+            limits=Limits(max_connections=16, max_keepalive_connections=16),
+        )
+
+
+# Length of one Zaptec energy detail slot.
+_QUARTER_HOUR = timedelta(minutes=15)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    # Zaptec emits UTC ISO 8601 timestamps like "2023-12-07T22:45:00.46+00:00",
+    # so the date and time fields sit at fixed offsets and can be sliced out
+    # without fromisoformat's general-purpose validation. The sub-second part
+    # is ignored; every consumer floors to 15-minute slots anyway. Any other
+    # shape falls back to fromisoformat.
+    if value.endswith("+00:00") or value.endswith("Z"):
+        try:
+            return datetime(
+                int(value[0:4]),
+                int(value[5:7]),
+                int(value[8:10]),
+                int(value[11:13]),
+                int(value[14:16]),
+                int(value[17:19]),
+                tzinfo=timezone.utc,
+            )
+        except ValueError:
+            pass
+    return datetime.fromisoformat(value)
+
 
 def time_floor(time: datetime, floor_to_seconds: int = 15 * 60) -> datetime:
-    seconds = (time.replace(tzinfo=None) - datetime.min).seconds
-    rounding = seconds // floor_to_seconds * floor_to_seconds
-    return time + timedelta(seconds=rounding - seconds, microseconds=-time.microsecond)
+    seconds = time.hour * 3600 + time.minute * 60 + time.second
+    return time - timedelta(
+        seconds=seconds % floor_to_seconds, microseconds=time.microsecond
+    )
 
 
 @dataclass
 class UserChargeHistory:
     user_name: str
     full_name: str
+    # Sorted by time; ChargeHistoryParser guarantees the order.
     consumption: dict[datetime, float]
 
 
@@ -121,38 +259,63 @@ class ChargeHistoryParser:
     Retrieve charge history for all users found from the document.
     """
 
-    def parse(self, data: str) -> dict[str, UserChargeHistory]:
-        result = {}
-        parsed = loads(data)
-        data_item = parsed["Data"]
-        for item in data_item:
+    # Documents up to this size are decoded in one go with orjson; larger
+    # ones are streamed with ijson to keep memory bounded.
+    STREAMING_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+    def parse(self, stream: IO[bytes]) -> dict[str, UserChargeHistory]:
+        result: dict[str, UserChargeHistory] = {}
+        # Bind the per-detail work to locals; the inner loop below runs once
+        # per 15-minute slot of every charging session in the month.
+        get_detail = itemgetter("Timestamp", "Energy")
+        parse_timestamp = _parse_timestamp
+        floor = time_floor
+        quarter = _QUARTER_HOUR
+        for item in self._items(stream):
             if "UserUserName" not in item:
                 if float(item["Energy"]) > 0:
                     raise RuntimeError(
                         f"Found charging session {item['Id']} without user identification!"
                     )
                 continue
-            user_name = item["UserUserName"]  # type:ignore
-            history = result.get(  # type:ignore
-                user_name,
-                UserChargeHistory(user_name, item["UserFullName"], {}),  # type:ignore
+            user_name = item["UserUserName"]
+            # The "or setdefault" split avoids constructing a throwaway
+            # UserChargeHistory on every session of an already-seen user.
+            history = result.get(user_name) or result.setdefault(
+                user_name, UserChargeHistory(user_name, item["UserFullName"], {})
             )
-            session_energy = float(item["Energy"])  # type:ignore
+            session_energy = float(item["Energy"])
             detail_energy_total = 0.0
-            energy_details = item["EnergyDetails"]  # type:ignore
+            energy_details = item["EnergyDetails"]
+            consumption = history.consumption
+            last_index = len(energy_details) - 1
             for i, energy_detail in enumerate(energy_details):
-                timestamp = datetime.fromisoformat(energy_detail["Timestamp"])  # type:ignore
-                energy = float(energy_detail["Energy"])  # type:ignore
+                timestamp_text, energy_value = get_detail(energy_detail)
+                energy = float(energy_value)
                 if energy > 0:
-                    consumption_start = (
-                        time_floor(timestamp)
-                        if i == len(energy_details) - 1
-                        else time_floor(timestamp) - timedelta(minutes=15)
-                    )
-                    if consumption_start in history.consumption:  # type:ignore
-                        raise RuntimeError
-                    history.consumption[consumption_start] = energy  # type:ignore
+                    consumption_start = floor(parse_timestamp(timestamp_text))
+                    if i != last_index:
+                        consumption_start -= quarter
+                    # setdefault returns this exact float object only when it
+                    # inserted it, so one dict operation both writes the slot
+                    # and detects a pre-existing one.
+                    if consumption.setdefault(consumption_start, energy) is not energy:
+                        raise RuntimeError(
+                            f"Duplicate consumption at {consumption_start} "
+                            f"for user {user_name}!"
+                        )
                     detail_energy_total += energy
             assert abs(session_energy - detail_energy_total) < 0.0001
-            result[user_name] = history  # type:ignore
-        return dict(sorted(result.items()))  # type:ignore
+        for history in result.values():
+            history.consumption = dict(sorted(history.consumption.items()))
+        return {user_name: result[user_name] for user_name in sorted(result)}
+
+    @classmethod
+    def _items(cls, stream: IO[bytes]) -> Iterator[Any]:
+        stream.seek(0, 2)
+        size = stream.tell()
+        stream.seek(0)
+        if size <= cls.STREAMING_THRESHOLD_BYTES:
+            yield from orjson.loads(stream.read())["Data"]
+        else:
+            yield from ijson_items(stream, "Data.item", use_float=True)
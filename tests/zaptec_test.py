@@ -6,8 +6,8 @@ from zaptec import ChargeHistoryParser, time_floor
 
 def test_parser():
     test_file = Path(__file__).parent / "data" / "zaptec-2023-11.json"
-    with open(test_file) as stream:
-        result = ChargeHistoryParser().parse(stream.read())
+    with open(test_file, "rb") as stream:
+        result = ChargeHistoryParser().parse(stream)
         assert len(result) == 1
         history = result["matti.meikalainen@example.com"]
         consumption = history.consumption